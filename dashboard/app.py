@@ -1,71 +1,198 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import polars as pl
+import plotly.graph_objects as go
 import numpy as np
-import pycountry_convert as pc
-from geopy.geocoders import Nominatim
+from numba import njit
 
 # --- CONFIGURACIÓN ---
 st.set_page_config(page_title="Dashboard COVID-19", layout="wide")
 
+@njit(cache=True)
+def rolling7_diff(x):
+    """Media móvil de 7 días de los casos nuevos (diff + SMA en una sola pasada)."""
+    out = np.empty(x.shape[0])
+    ring = np.zeros(7)
+    s = 0.0
+    prev = x[0]
+    for i in range(x.shape[0]):
+        new_cases = x[i] - prev
+        prev = x[i]
+        s += new_cases - ring[i % 7]
+        ring[i % 7] = new_cases
+        out[i] = s / 7.0 if i >= 6 else np.nan
+    return out
+
 # --- CARGA DE DATOS OPTIMIZADA ---
-@st.cache_data
-def get_continent(country_name):
-    """Asigna continente basado en el nombre del país."""
-    try:
-        # Mapeo manual extendido para JHU
-        corrections = {
-            "US": "United States", "Korea, South": "South Korea", "Taiwan*": "Taiwan",
-            "Burma": "Myanmar", "Congo (Kinshasa)": "Congo", "Congo (Brazzaville)": "Congo",
-            "Cote d'Ivoire": "Ivory Coast", "West Bank and Gaza": "Israel",
-            "Russia": "Russian Federation", "Vietnam": "Viet Nam", "Laos": "Lao People's Democratic Republic",
-            "Syria": "Syrian Arab Republic", "Iran": "Iran, Islamic Republic of",
-            "Tanzania": "Tanzania, United Republic of", "Venezuela": "Venezuela, Bolivarian Republic of",
-            "Bolivia": "Bolivia, Plurinational State of", "Brunei": "Brunei Darussalam",
-            "United Kingdom": "United Kingdom", "France": "France"
-        }
-        country_name = corrections.get(country_name, country_name)
-        country_alpha2 = pc.country_name_to_country_alpha2(country_name)
-        continent_code = pc.country_alpha2_to_continent_code(country_alpha2)
-        continents = {
-            'NA': 'North America', 'SA': 'South America', 'AS': 'Asia',
-            'OC': 'Oceania', 'EU': 'Europe', 'AF': 'Africa'
-        }
-        return continents.get(continent_code, "Others")
-    except:
-        return "Others"
-
-COUNTRY_COORDS = {
-    "France": {"lat": 46.2276, "long": 2.2137},
-    "United Kingdom": {"lat": 55.3781, "long": -3.4360},
-    "Denmark": {"lat": 56.2639, "long": 9.5018},
-    "Netherlands": {"lat": 52.1326, "long": 5.2913},
-    "US": {"lat": 37.0902, "long": -95.7129},
-    "United States": {"lat": 37.0902, "long": -95.7129}
-}
+METRICS = ["confirmed", "deaths", "recovered", "active"]
+NS_PER_DAY = 86_400_000_000_000
 
-@st.cache_data
-def load_data():
-    # Cargar datos y asegurar tipos
-    df = pd.read_csv("covid_2020_2022.csv", parse_dates=["file_date"])
+# Combinaciones de filtros que se mantienen en caché (vista y figuras)
+MAX_VIEWS = 32
 
-    # Asegurar que existan todas las columnas necesarias
-    if "active" not in df.columns:
-        df["active"] = df["confirmed"] - df["deaths"] - df["recovered"]
-    
-    # Crear columna de continente
-    unique_countries = df["country_region"].unique()
-    continent_map = {c: get_continent(c) for c in unique_countries}
-    df["Continent"] = df["country_region"].map(continent_map)
-    
-    return df
+# Columnas que usa el dashboard (el resto del Parquet no se lee)
+NEEDED_COLS = ["file_date", "country_region", "Continent", "confirmed", "deaths", "recovered", "active", "lat", "long_"]
+
+@st.cache_resource
+def load_data():
+    # cache_resource: un solo objeto compartido de solo lectura (sin copiarlo en cada llamada)
+    # Parquet enriquecido por etl.py (continente, coordenadas fijas por país y tipos
+    # reducidos). Pre-agregado país x día: el dashboard nunca necesita el detalle
+    # por provincia; las coordenadas son las mismas para todo el país
+    df_country_day = (
+        pl.scan_parquet("covid_enriched.parquet")
+        .select(NEEDED_COLS)
+        # Llave de día int32 (días desde epoch): más liviana que datetime64[ns]
+        .with_columns(pl.col("file_date").dt.epoch("d").cast(pl.Int32).alias("day"))
+        .group_by("day", "country_region", "Continent")
+        .agg(pl.col(METRICS).sum(), pl.col("lat", "long_").first())
+        .sort("day", "country_region")
+        .collect()
+        .to_pandas()
+    )
+
+    # Columnas categóricas: filtros y groupby trabajan sobre códigos enteros
+    df_country_day["country_region"] = df_country_day["country_region"].astype("category")
+    df_country_day["Continent"] = df_country_day["Continent"].astype("category")
+
+    # Orden por día (hecho en Polars): el filtro de rango se resuelve con searchsorted
+    days = df_country_day["day"].to_numpy()
+
+    # Índice continente -> países para el filtro en cascada
+    continent_to_countries = {
+        c: np.sort(sub["country_region"].astype(str).unique())
+        for c, sub in df_country_day.groupby("Continent", observed=True)
+    }
+
+    return df_country_day, days, continent_to_countries
 
 try:
-    df = load_data()
+    df_country_day, days, continent_to_countries = load_data()
 except FileNotFoundError:
     st.error("No se encontró el archivo de datos. Ejecuta la etapa de generación primero.")
     st.stop()
 
+# --- VISTA FILTRADA (CACHEADA POR ESTADO DE LOS FILTROS) ---
+@st.cache_data(max_entries=MAX_VIEWS)
+def compute_view(continents, countries, start_date, end_date):
+    """Filtra y agrega los datos para una combinación de filtros (tuplas hashables)."""
+    df_country_day, days, _ = load_data()
+
+    # Búsqueda binaria sobre los días ordenados en vez de una máscara completa
+    start_day = pd.Timestamp(start_date).value // NS_PER_DAY
+    end_day = pd.Timestamp(end_date).value // NS_PER_DAY
+    lo = np.searchsorted(days, start_day)
+    hi = np.searchsorted(days, end_day + 1)
+    df_filtered = df_country_day.iloc[lo:hi]
+    days_filtered = days[lo:hi]
+
+    if continents or countries:
+        mask = np.ones(len(df_filtered), dtype=bool)
+        if continents:
+            mask &= df_filtered["Continent"].isin(continents).to_numpy()
+        if countries:
+            mask &= df_filtered["country_region"].isin(countries).to_numpy()
+        df_filtered = df_filtered[mask]
+        days_filtered = days_filtered[mask]
+
+    # Línea de tiempo: suma por día con bincount sobre el índice de día (sin groupby);
+    # las fechas se reconstruyen solo para las filas de la línea de tiempo
+    day_codes = days_filtered - start_day
+    n_days = end_day - start_day + 1
+    days_present = np.bincount(day_codes, minlength=n_days) > 0
+    timeline = pd.DataFrame({"file_date": pd.to_datetime(start_day + np.flatnonzero(days_present), unit="D")})
+    for col in METRICS:
+        timeline[col] = np.bincount(day_codes, weights=df_filtered[col].to_numpy(), minlength=n_days)[days_present]
+
+    # El último día es la cola del bloque ordenado: basta una búsqueda binaria
+    df_last_day = df_filtered.iloc[np.searchsorted(days_filtered, end_day):]
+
+    if df_last_day.empty:
+        return {
+            "timeline": timeline,
+            "df_last_day": df_last_day,
+            "country_totals": pd.DataFrame(),
+            "top_active": pd.DataFrame(),
+            "kpi_confirmed": 0,
+            "kpi_deaths": 0,
+        }
+
+    # df_last_day ya tiene una fila por país con sus coordenadas fijas (etl.py)
+    country_totals = df_last_day[["country_region", "confirmed", "lat", "long_"]]
+
+    # Ranking por casos ACTIVOS
+    top_active = df_last_day.groupby("country_region", observed=True)["active"].max().nlargest(10).reset_index()
+
+    return {
+        "timeline": timeline,
+        "df_last_day": df_last_day,
+        # Limpiar nulos finales
+        "country_totals": country_totals.dropna(subset=["lat", "long_"]),
+        "top_active": top_active,
+        # Acumulador int64 explícito para los totales globales
+        "kpi_confirmed": df_last_day["confirmed"].to_numpy().sum(dtype=np.int64),
+        "kpi_deaths": df_last_day["deaths"].to_numpy().sum(dtype=np.int64),
+    }
+
+# --- GRÁFICOS (CACHEADOS CON LA MISMA CLAVE QUE LA VISTA) ---
+# Cada builder devuelve el dict ya serializado de la figura, así en un rerun
+# con los mismos filtros no se reconstruyen trazas ni layout.
+STATE_COLORS = {
+    "confirmed": "#3366CC", # Azul
+    "active": "#FF9900",    # Naranja
+    "recovered": "#109618", # Verde
+    "deaths": "#DC3912"     # Rojo
+}
+
+@st.cache_data(max_entries=MAX_VIEWS)
+def build_evol_fig(continents, countries, start_date, end_date):
+    # plotly_resampler (arrastra dash) solo se usa aquí: se importa al construir la figura (fuera del arranque)
+    from plotly_resampler import FigureResampler
+
+    timeline = compute_view(continents, countries, start_date, end_date)["timeline"]
+
+    # Trazas WebGL con resampling estático (Streamlit no re-muestrea al hacer zoom):
+    # con datos diarios (~1.075 días) no se recorta nada; solo actúa sobre 2000 puntos
+    fig_evol = FigureResampler(go.Figure(), default_n_shown_samples=2000)
+    for col in METRICS:
+        fig_evol.add_trace(go.Scattergl(name=col, mode="lines", line=dict(color=STATE_COLORS[col])),
+                           hf_x=timeline["file_date"].to_numpy(), hf_y=timeline[col].to_numpy())
+    fig_evol.update_layout(title="Curvas de Evolución", xaxis_title="file_date", yaxis_title="Casos",
+                           legend_title_text="Estado")
+    return fig_evol.to_dict()
+
+@st.cache_data(max_entries=MAX_VIEWS)
+def build_map_fig(continents, countries, start_date, end_date):
+    map_data = compute_view(continents, countries, start_date, end_date)["country_totals"]
+    confirmed = map_data["confirmed"].to_numpy()
+    max_confirmed = confirmed.max()
+    size_max = 35
+
+    fig_map = go.Figure(go.Scattergeo(
+        lat=map_data["lat"].to_numpy(), lon=map_data["long_"].to_numpy(),
+        hovertext=map_data["country_region"].to_numpy(), customdata=confirmed,
+        hovertemplate="<b>%{hovertext}</b><br>confirmed=%{customdata:,}<extra></extra>",
+        marker=dict(size=confirmed, sizemode="area",
+                    sizeref=2.0 * max_confirmed / size_max ** 2 if max_confirmed > 0 else 1,
+                    color=confirmed, colorscale="Reds", showscale=True,
+                    colorbar=dict(title="confirmed")),
+    ))
+    fig_map.update_geos(projection_type="natural earth")
+    fig_map.update_layout(title="Distribución Geográfica", margin={"r":0,"t":30,"l":0,"b":0})
+    return fig_map.to_dict()
+
+@st.cache_data(max_entries=MAX_VIEWS)
+def build_rank_fig(continents, countries, start_date, end_date):
+    # plotly.express solo se usa aquí: se importa al construir la figura (fuera del arranque)
+    import plotly.express as px
+
+    top_active = compute_view(continents, countries, start_date, end_date)["top_active"]
+    fig_rank = px.bar(top_active, x="active", y="country_region", orientation='h',
+                      color="active", color_continuous_scale="Oranges",
+                      title="Países con mayor casos activos.")
+    fig_rank.update_layout(yaxis={'categoryorder':'total ascending'}, margin={"r":0,"t":30,"l":0,"b":0})
+    return fig_rank.to_dict()
+
 # --- TÍTULO ---
 st.title("Tendencias Epidemiológicas Globales COVID-19 (2020-2022)")
 st.markdown("---")
@@ -74,40 +201,31 @@ st.markdown("---")
 st.sidebar.header("Filtros")
 
 #Filtro de Continente
-all_continents = sorted(df["Continent"].unique())
+all_continents = sorted(df_country_day["Continent"].cat.categories)
 selected_continents = st.sidebar.multiselect("Filtrar por Continente", all_continents)
 
 #Filtro de País (Dependiente del continente seleccionado)
 if selected_continents:
-    filtered_countries = df[df["Continent"].isin(selected_continents)]["country_region"].unique()
+    filtered_countries = np.concatenate([continent_to_countries[c] for c in selected_continents])
 else:
-    filtered_countries = df["country_region"].unique()
+    filtered_countries = np.concatenate(list(continent_to_countries.values()))
 
 selected_countries = st.sidebar.multiselect("Filtrar por País", sorted(filtered_countries))
 
 #Filtro de Fechas
-min_date = df["file_date"].min().date()
-max_date = df["file_date"].max().date()
+min_date = pd.to_datetime(days[0], unit="D").date()
+max_date = pd.to_datetime(days[-1], unit="D").date()
 start_date, end_date = st.sidebar.date_input("Rango de Fechas", [min_date, max_date], min_value=min_date, max_value=max_date)
 
 # --- FILTRADO DEL DATAFRAME ---
-mask_date = (df["file_date"].dt.date >= start_date) & (df["file_date"].dt.date <= end_date)
-df_filtered = df.loc[mask_date]
-
-if selected_continents:
-    df_filtered = df_filtered[df_filtered["Continent"].isin(selected_continents)]
-if selected_countries:
-    df_filtered = df_filtered[df_filtered["country_region"].isin(selected_countries)]
+view_key = (tuple(selected_continents), tuple(selected_countries), start_date, end_date)
+view = compute_view(*view_key)
+timeline = view["timeline"]
+df_last_day = view["df_last_day"]
 
 # --- KPIs (INDICADORES CLAVE) ---
-df_last_day = df_filtered[df_filtered["file_date"].dt.date == end_date]
-
-if not df_last_day.empty:
-    kpi_confirmed = df_last_day["confirmed"].sum()
-    kpi_deaths = df_last_day["deaths"].sum()
-else:
-    kpi_confirmed = 0
-    kpi_deaths = 0
+kpi_confirmed = view["kpi_confirmed"]
+kpi_deaths = view["kpi_deaths"]
 
 # Tasa de Letalidad
 fatality_rate = (kpi_deaths / kpi_confirmed * 100) if kpi_confirmed > 0 else 0
@@ -122,22 +240,8 @@ st.markdown("---")
 # --- EVOLUCION TEMPORAL --
 st.subheader("Evolución Temporal Comparativa")
 
-# Agrupar por fecha para la línea de tiempo
-timeline = df_filtered.groupby("file_date")[["confirmed", "deaths", "recovered", "active"]].sum().reset_index()
-
 if not timeline.empty:
-    # Pivotar para Plotly (formato largo)
-    timeline_long = timeline.melt(id_vars="file_date", var_name="Estado", value_name="Casos")
-    
-    fig_evol = px.line(timeline_long, x="file_date", y="Casos", color="Estado",
-                       color_discrete_map={
-                           "confirmed": "#3366CC", # Azul
-                           "active": "#FF9900",    # Naranja
-                           "recovered": "#109618", # Verde
-                           "deaths": "#DC3912"     # Rojo
-                       },
-                       title="Curvas de Evolución")
-    st.plotly_chart(fig_evol, use_container_width=True)
+    st.plotly_chart(build_evol_fig(*view_key), use_container_width=True)
 else:
     st.warning("No hay datos para el rango seleccionado.")
 
@@ -147,39 +251,10 @@ st.markdown("---")
 st.markdown("---")
 st.subheader("Mapa Global (Casos Confirmados)")
 
-if not df_last_day.empty:
-  country_totals = df_last_day.groupby("country_region")[["confirmed", "lat", "long_"]].agg({
-        "confirmed": "sum",
-        "lat": "first", # Temporal
-        "long_": "first" # Temporal
-    }).reset_index()
-
-def fix_coords(row):
-        if row["country_region"] in COUNTRY_COORDS:
-            return pd.Series([COUNTRY_COORDS[row["country_region"]]["lat"], COUNTRY_COORDS[row["country_region"]]["long"]])
-        else:
-            # Si no está en manual, intentamos tomar la coordenada del registro con más casos de ese país
-            # (Para esto necesitamos volver al df original filtrado)
-            try:
-                country_data = df_last_day[df_last_day["country_region"] == row["country_region"]]
-                best_row = country_data.sort_values("confirmed", ascending=False).iloc[0]
-                return pd.Series([best_row["lat"], best_row["long_"]])
-            except:
-                return pd.Series([row["lat"], row["long_"]])
-
-country_totals[["lat", "long_"]] = country_totals.apply(fix_coords, axis=1)
-    
-# Limpiar nulos finales
-map_data = country_totals.dropna(subset=["lat", "long_"])
+map_data = view["country_totals"]
 
 if not map_data.empty:
-    fig_map = px.scatter_geo(map_data, lat="lat", lon="long_", size="confirmed",
-                                 color="confirmed", hover_name="country_region",
-                                 color_continuous_scale="Reds", size_max=35,
-                                 projection="natural earth",
-                                 title="Distribución Geográfica")
-    fig_map.update_layout(margin={"r":0,"t":30,"l":0,"b":0})
-    st.plotly_chart(fig_map, use_container_width=True)
+    st.plotly_chart(build_map_fig(*view_key), use_container_width=True)
 else:
     st.info("Sin datos geográficos.")
     
@@ -211,12 +286,11 @@ with col_analysis:
         st.write("") 
 
         # 2. Indicador de Rebrote
-        timeline["new_cases"] = timeline["confirmed"].diff().fillna(0)
-        timeline["7d_avg"] = timeline["new_cases"].rolling(window=7).mean()
+        avg_7d = rolling7_diff(timeline["confirmed"].to_numpy(dtype=np.float64))
         
         if len(timeline) >= 14:
-            current_week_avg = timeline["7d_avg"].iloc[-1]
-            prev_week_avg = timeline["7d_avg"].iloc[-8]
+            current_week_avg = avg_7d[-1]
+            prev_week_avg = avg_7d[-8]
             rebound_ratio = current_week_avg / prev_week_avg if prev_week_avg > 0 else 0
             
             if rebound_ratio > 1.2:
@@ -233,16 +307,10 @@ with col_analysis:
 # --- RANKING ---
 with col_ranking:
     st.subheader("Top Países (Casos Activos)")
-    # Ranking por casos ACTIVOS
+    top_active = view["top_active"]
     if not df_last_day.empty:
-        top_active = df_last_day.groupby("country_region")["active"].max().sort_values(ascending=False).head(10).reset_index()
-    
         if not top_active.empty:
-            fig_rank = px.bar(top_active, x="active", y="country_region", orientation='h',
-                              color="active", color_continuous_scale="Oranges",
-                              title="Países con mayor casos activos.")
-            fig_rank.update_layout(yaxis={'categoryorder':'total ascending'}, margin={"r":0,"t":30,"l":0,"b":0})
-            st.plotly_chart(fig_rank, use_container_width=True)
+            st.plotly_chart(build_rank_fig(*view_key), use_container_width=True)
         else:
             st.info("No hay datos para el ranking.")
     else:
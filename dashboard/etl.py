@@ -0,0 +1,82 @@
+import functools
+
+import pandas as pd
+import pycountry_convert as pc
+from pycountry_convert.convert_country_alpha2_to_continent_code import COUNTRY_ALPHA2_TO_CONTINENT_CODE
+
+# ETL previo al dashboard: lee el archivo maestro y escribe un Parquet ya
+# enriquecido (continente y coordenadas por país), así la app no necesita
+# pycountry_convert ni recalcular nada al arrancar.
+
+# Mapeo manual extendido para JHU
+CORRECTIONS = {
+    "US": "United States", "Korea, South": "South Korea", "Taiwan*": "Taiwan",
+    "Burma": "Myanmar", "Congo (Kinshasa)": "Congo", "Congo (Brazzaville)": "Congo",
+    "Cote d'Ivoire": "Ivory Coast", "West Bank and Gaza": "Israel",
+    "Russia": "Russian Federation", "Vietnam": "Viet Nam", "Laos": "Lao People's Democratic Republic",
+    "Syria": "Syrian Arab Republic", "Iran": "Iran, Islamic Republic of",
+    "Tanzania": "Tanzania, United Republic of", "Venezuela": "Venezuela, Bolivarian Republic of",
+    "Bolivia": "Bolivia, Plurinational State of", "Brunei": "Brunei Darussalam",
+    "United Kingdom": "United Kingdom", "France": "France"
+}
+
+CONTINENTS = {
+    'NA': 'North America', 'SA': 'South America', 'AS': 'Asia',
+    'OC': 'Oceania', 'EU': 'Europe', 'AF': 'Africa'
+}
+
+# Tablas de pycountry_convert precalculadas una vez. Igual que
+# country_name_to_country_alpha2, los nombres de 3 letras se leen como Alpha-3
+# y los de 2 letras no se reconocen
+_COUNTRY_TO_ALPHA2 = {name: a2 for name, a2 in pc.map_country_name_to_country_alpha2().items() if len(name) > 3}
+_COUNTRY_TO_ALPHA2.update(pc.map_country_alpha3_to_country_alpha2())
+
+@functools.lru_cache(maxsize=None)
+def get_continent(country_name):
+    """Asigna continente basado en el nombre del país."""
+    country_name = CORRECTIONS.get(country_name, country_name)
+    country_alpha2 = _COUNTRY_TO_ALPHA2.get(country_name)
+    if country_alpha2 is None:
+        return "Others"
+    return CONTINENTS.get(COUNTRY_ALPHA2_TO_CONTINENT_CODE.get(country_alpha2), "Others")
+
+COUNTRY_COORDS = {
+    "France": {"lat": 46.2276, "long": 2.2137},
+    "United Kingdom": {"lat": 55.3781, "long": -3.4360},
+    "Denmark": {"lat": 56.2639, "long": 9.5018},
+    "Netherlands": {"lat": 52.1326, "long": 5.2913},
+    "US": {"lat": 37.0902, "long": -95.7129},
+    "United States": {"lat": 37.0902, "long": -95.7129}
+}
+
+df = pd.read_csv("covid_2020_2022.csv", parse_dates=["file_date"])
+
+# Asegurar que existan todas las columnas necesarias
+if "active" not in df.columns:
+    df["active"] = df["confirmed"] - df["deaths"] - df["recovered"]
+
+# Conteos a int32 (los NaN se suman como 0 en el dashboard) y coordenadas a float32
+for c in ["confirmed", "deaths", "recovered", "active"]:
+    df[c] = df[c].fillna(0).astype("int32")
+df[["lat", "long_"]] = df[["lat", "long_"]].astype("float32")
+
+# Crear columna de continente
+unique_countries = df["country_region"].unique()
+continent_map = {c: get_continent(c) for c in unique_countries}
+df["Continent"] = df["country_region"].map(continent_map)
+
+# Coordenada fija por país: la manual si existe, si no la del registro con más casos
+best_coords = (
+    df.dropna(subset=["lat", "long_"])
+    .sort_values("confirmed", ascending=False)
+    .drop_duplicates("country_region")
+    .set_index("country_region")[["lat", "long_"]]
+)
+for country, coord in COUNTRY_COORDS.items():
+    best_coords.loc[country] = [coord["lat"], coord["long"]]
+df["lat"] = df["country_region"].map(best_coords["lat"]).astype("float32")
+df["long_"] = df["country_region"].map(best_coords["long_"]).astype("float32")
+
+cols = ["file_date", "country_region", "Continent", "confirmed", "deaths", "recovered", "active", "lat", "long_"]
+df[cols].to_parquet("covid_enriched.parquet", engine="pyarrow", compression="snappy", index=False)
+print(f"¡Listo! Archivo 'covid_enriched.parquet' creado. Filas: {len(df)}")